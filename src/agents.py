@@ -33,7 +33,7 @@ class ActionAgent:
     def __init__(self, model: str = "llama3.2"):
         self.model = model
     
-    def parse(self, user_input: str) -> List[Action]:
+    def parse(self, user_input: str, model: Optional[str] = None) -> List[Action]:
         prompt = f"""Tu es un parser d'actions pour un assistant de courses.
 
 TYPES D'ACTIONS: add, remove, view, validate, clear
@@ -58,7 +58,7 @@ INPUT: "{user_input}"
 JSON:"""
 
         try:
-            response = ollama.generate(model=self.model, prompt=prompt)
+            response = ollama.generate(model=model or self.model, prompt=prompt)
             text = response['response'].strip()
             
             start = text.find('[')
@@ -78,11 +78,18 @@ JSON:"""
             return []
 
 
+DEFAULT_CATEGORIES = [
+    "pates", "riz", "lait", "yaourt", "fromage", "viande", "poisson", "legume_frais",
+    "fruit_frais", "sauce", "chocolat", "chips", "biscuits", "pain"
+]
+
+
 class IngredientAgent:
-    def __init__(self, model: str = "llama3.2"):
+    def __init__(self, model: str = "llama3.2", categories: Optional[List[str]] = None):
         self.model = model
+        self.categories = categories or DEFAULT_CATEGORIES
     
-    def parse(self, text: str) -> List[Ingredient]:
+    def parse(self, text: str, model: Optional[str] = None) -> List[Ingredient]:
         prompt = f"""Tu extrais les ingrédients d'une demande de courses.
 
 RÈGLES STRICTES:
@@ -91,8 +98,7 @@ RÈGLES STRICTES:
 3. Si c'est une recette, décompose en ingrédients de base
 4. Utilise quantity=1 si non spécifié
 
-CATÉGORIES: pates, riz, lait, yaourt, fromage, viande, poisson, legume_frais, 
-fruit_frais, sauce, chocolat, chips, biscuit, pain
+CATÉGORIES (utilise UNIQUEMENT celles-ci): {', '.join(self.categories)}
 
 Retourne UNIQUEMENT un JSON array valide, rien d'autre.
 
@@ -111,7 +117,7 @@ INPUT: "{text}"
 JSON:"""
 
         try:
-            response = ollama.generate(model=self.model, prompt=prompt)
+            response = ollama.generate(model=model or self.model, prompt=prompt)
             text = response['response'].strip()
             
             start = text.find('[')
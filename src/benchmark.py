@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Dict
+
+from database import GroceryDB, CHROMADB_AVAILABLE
+
+if CHROMADB_AVAILABLE:
+    import numpy as np
+    from chromadb import Documents, EmbeddingFunction, Embeddings
+    from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+
+
+QUERIES = [
+    ("lait", "lait"),
+    ("pâtes", "pates"),
+    ("sauce tomate", "sauce"),
+    ("viande hachée", "viande"),
+    ("yaourt nature", "yaourt"),
+    ("chocolat noir", "chocolat"),
+]
+
+
+if CHROMADB_AVAILABLE:
+    class HashEmbedding(EmbeddingFunction):
+        """Embedding hors-ligne par hachage de trigrammes (pas de modèle à télécharger)."""
+
+        DIM = 384
+
+        def __init__(self):
+            pass
+
+        def __call__(self, input: Documents) -> Embeddings:
+            embeddings = []
+            for text in input:
+                vector = np.zeros(self.DIM, dtype=np.float32)
+                for token in text.lower().split():
+                    for i in range(len(token) - 2):
+                        h = int(hashlib.md5(token[i:i + 3].encode()).hexdigest(), 16)
+                        vector[h % self.DIM] += 1
+                embeddings.append(vector / (np.linalg.norm(vector) or 1))
+            return embeddings
+
+        @staticmethod
+        def name() -> str:
+            return "hash_trigram"
+
+
+def scale_catalog(products: List[Dict], factor: int) -> List[Dict]:
+    scaled = []
+    for k in range(factor):
+        for p in products:
+            copy = dict(p)
+            copy['id'] = f"{p['id']}_{k}" if k else p['id']
+            scaled.append(copy)
+    return scaled
+
+
+def time_queries(search, query_embeddings, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for (query, category), embedding in zip(QUERIES, query_embeddings):
+            search(embedding, category)
+    return (time.perf_counter() - start) * 1000 / (repeat * len(QUERIES))
+
+
+def bench_filtered_search(products: List[Dict], factor: int, embedding_function, repeat: int = 5):
+    catalog = scale_catalog(products, factor)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = GroceryDB(db_path=str(Path(tmp) / "bench.db"), chroma_path=str(Path(tmp) / "chroma"),
+                       embedding_function=embedding_function)
+        db._create_tables()
+        db._insert_products(catalog)
+        db._build_semantic_index(catalog)
+
+        # Préchauffage : construit les shards
+        for query, category in QUERIES:
+            db._get_shard(category)
+
+        # Requêtes encodées une seule fois : seules les recherches vectorielles sont chronométrées
+        query_embeddings = embedding_function([query for query, _ in QUERIES])
+
+        def single(embedding, category):
+            db.products_collection.query(
+                query_embeddings=[embedding], n_results=30, where={"category": category}
+            )
+
+        def sharded(embedding, category):
+            shard = db._get_shard(category)
+            shard.query(query_embeddings=[embedding], n_results=min(30, shard.count()))
+
+        single_ms = time_queries(single, query_embeddings, repeat)
+        sharded_ms = time_queries(sharded, query_embeddings, repeat)
+        db.close()
+
+    print(f"{len(catalog):>8} produits | filtre global: {single_ms:7.2f} ms | "
+          f"shard: {sharded_ms:7.2f} ms | x{single_ms / sharded_ms:.2f}")
+
+
+def main():
+    args = [a for a in sys.argv[1:] if a != "--hash-embedding"]
+    if not args:
+        print("Usage: python benchmark.py <products.json> [facteur ...] [--hash-embedding]")
+        sys.exit(1)
+
+    if not CHROMADB_AVAILABLE:
+        print("⚠️  ChromaDB requis pour le benchmark")
+        sys.exit(1)
+
+    with open(args[0], 'r', encoding='utf-8') as f:
+        products = json.load(f)
+
+    factors = [int(f) for f in args[1:]] or [1, 4, 16]
+
+    if "--hash-embedding" in sys.argv:
+        embedding_function = HashEmbedding()
+    else:
+        embedding_function = DefaultEmbeddingFunction()
+
+    print("Latence moyenne d'une recherche filtrée par catégorie "
+          "(embedding de la requête exclu du chronométrage)")
+    print(f"Embedding: {type(embedding_function).__name__}")
+    for factor in factors:
+        bench_filtered_search(products, factor, embedding_function)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 
 import json
+import re
 import sqlite3
+import unicodedata
+from difflib import SequenceMatcher
 from typing import List, Dict, Optional
 from pathlib import Path
 
@@ -12,13 +15,27 @@ except ImportError:
     CHROMADB_AVAILABLE = False
     print("⚠️  ChromaDB non installé. Recherche sémantique désactivée.")
 
+RECIPE_STOPWORDS = {"du", "de", "des", "d", "le", "la", "les", "l", "au", "aux", "a", "en", "un", "une"}
+NUMBER_WORDS = {
+    "un": 1, "une": 1, "deux": 2, "trois": 3, "quatre": 4, "cinq": 5, "six": 6,
+    "sept": 7, "huit": 8, "neuf": 9, "dix": 10, "douze": 12
+}
+
 
 class GroceryDB:
-    def __init__(self, db_path: str = "grocery.db", use_semantic: bool = True):
+    def __init__(self, db_path: str = "grocery.db", use_semantic: bool = True,
+                 chroma_path: str = "./chroma_db", embedding_function=None):
         self.db_path = db_path
+        self.chroma_path = chroma_path
+        # None = fonction d'embedding par défaut de ChromaDB
+        self.embedding_function = embedding_function
         self.conn = sqlite3.connect(db_path)
         self.conn.row_factory = sqlite3.Row
         self.cursor = self.conn.cursor()
+        self._categories: Optional[List[str]] = None
+        self._recipes: Optional[Dict[int, Dict[str, List[str]]]] = None
+        self._recipes_version: Optional[int] = None
+        self._create_shared_tables()
         
         self.use_semantic = use_semantic and CHROMADB_AVAILABLE
         if self.use_semantic:
@@ -26,14 +43,24 @@ class GroceryDB:
         
     def _init_chromadb(self):
         try:
-            self.chroma_client = chromadb.PersistentClient(path="./chroma_db")
-            self.products_collection = self.chroma_client.get_or_create_collection(name="products")
+            self.chroma_client = chromadb.PersistentClient(path=self.chroma_path)
+            # Shard global (requêtes sans catégorie) + un shard par catégorie, chargés à la demande
+            self.products_collection = self._get_collection("products")
+            self.shards: Dict[str, object] = {}
             print("✓ ChromaDB initialisé")
         except Exception as e:
             print(f"⚠️  Erreur ChromaDB: {e}")
             self.use_semantic = False
     
-    def initialize_from_json(self, products_json: str, users_json: str):
+    def _get_collection(self, name: str):
+        if self.embedding_function is None:
+            return self.chroma_client.get_or_create_collection(name=name)
+        return self.chroma_client.get_or_create_collection(
+            name=name, embedding_function=self.embedding_function
+        )
+    
+    def initialize_from_json(self, products_json: str, users_json: str,
+                             recipes_json: Optional[str] = None):
         self._create_tables()
         
         with open(products_json, 'r', encoding='utf-8') as f:
@@ -47,6 +74,10 @@ class GroceryDB:
         if self.use_semantic:
             self._build_semantic_index(products)
         
+        if recipes_json:
+            count = self.load_recipes(recipes_json)
+            print(f"✓ {count} recette(s) chargée(s)")
+        
         print(f"✓ Base initialisée: {len(products)} produits, {len(users_data['users'])} utilisateurs")
     
     def _create_tables(self):
@@ -90,6 +121,202 @@ class GroceryDB:
         """)
         
         self.conn.commit()
+        self._create_shared_tables()
+    
+    def _create_shared_tables(self):
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        """)
+        
+        # Décompositions de recettes validées, partagées par tous les utilisateurs
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS recipes (
+                name TEXT PRIMARY KEY,
+                display_name TEXT NOT NULL,
+                ingredients TEXT NOT NULL
+            )
+        """)
+        
+        # Résultats bruts (IDs classés, avant préférences) partagés par tous les utilisateurs
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS search_cache (
+                query TEXT,
+                category TEXT,
+                index_version INTEGER,
+                product_ids TEXT NOT NULL,
+                PRIMARY KEY (query, category, index_version)
+            )
+        """)
+        
+        self.conn.commit()
+    
+    def get_index_version(self) -> int:
+        self.cursor.execute("SELECT value FROM meta WHERE key = 'index_version'")
+        row = self.cursor.fetchone()
+        return int(row['value']) if row else 0
+    
+    def _invalidate_search_cache(self):
+        """Passe à une nouvelle version d'index : le catalogue ou l'index a changé."""
+        version = self.get_index_version() + 1
+        self.cursor.execute("""
+            INSERT OR REPLACE INTO meta (key, value) VALUES ('index_version', ?)
+        """, (str(version),))
+        self.cursor.execute("DELETE FROM search_cache")
+        self.conn.commit()
+        self._categories = None
+    
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        return re.sub(r"\s+", " ", query.strip().lower())
+    
+    def _get_cached_ids(self, query: str, category: Optional[str]) -> Optional[List[str]]:
+        self.cursor.execute("""
+            SELECT product_ids FROM search_cache
+            WHERE query = ? AND category = ? AND index_version = ?
+        """, (self._normalize_query(query), category or "", self.get_index_version()))
+        row = self.cursor.fetchone()
+        return json.loads(row['product_ids']) if row else None
+    
+    def _cache_ids(self, query: str, category: Optional[str], product_ids: List[str]):
+        self.cursor.execute("""
+            INSERT OR REPLACE INTO search_cache (query, category, index_version, product_ids)
+            VALUES (?, ?, ?, ?)
+        """, (self._normalize_query(query), category or "", self.get_index_version(),
+              json.dumps(product_ids)))
+        self.conn.commit()
+    
+    @staticmethod
+    def _strip_quantity(name: str) -> str:
+        """Retire la quantité en tête ("2 pâtes bolognaise" → "pâtes bolognaise")."""
+        words = name.strip().split()
+        while words and (words[0].isdigit() or words[0].lower() in NUMBER_WORDS):
+            words = words[1:]
+        return " ".join(words)
+    
+    @staticmethod
+    def _normalize_recipe(name: str) -> str:
+        text = unicodedata.normalize("NFKD", name.lower())
+        text = "".join(c for c in text if not unicodedata.combining(c))
+        text = re.sub(r"[^a-z0-9]+", " ", text)
+        # Les quantités ne font pas partie du nom : "2 pates bolognaise" == "pates bolognaise"
+        words = GroceryDB._strip_quantity(text).split()
+        while words and words[0] in RECIPE_STOPWORDS:
+            words = words[1:]
+        return " ".join(words)
+    
+    @staticmethod
+    def _content_words(key: str) -> List[str]:
+        return [w for w in key.split() if w not in RECIPE_STOPWORDS and not w.isdigit()]
+    
+    @staticmethod
+    def _words_match(a: str, b: str, cutoff: float) -> bool:
+        # Singulier/pluriel puis fautes de frappe : "pate" == "pates", "bolognese" == "bolognaise".
+        # Au plus une lettre de différence en longueur : "pate" != "patate"
+        a, b = a.rstrip("sx"), b.rstrip("sx")
+        if a == b:
+            return True
+        return (min(len(a), len(b)) >= 5 and abs(len(a) - len(b)) <= 1
+                and SequenceMatcher(None, a, b).ratio() >= cutoff)
+    
+    @staticmethod
+    def _recipe_matches(query: List[str], candidate: List[str], cutoff: float) -> bool:
+        """Chaque mot de la requête doit correspondre à un mot distinct de la recette."""
+        if len(query) != len(candidate):
+            return False
+        remaining = list(candidate)
+        for word in query:
+            match = next((c for c in remaining if GroceryDB._words_match(word, c, cutoff)), None)
+            if match is None:
+                return False
+            remaining.remove(match)
+        return True
+    
+    @staticmethod
+    def recipe_quantity(name: str) -> int:
+        """Quantité en tête du texte ("2 ...", "deux ..."), 1 par défaut."""
+        words = name.strip().lower().split()
+        if words and words[0].isdigit():
+            return max(int(words[0]), 1)
+        if words and words[0] in NUMBER_WORDS:
+            return NUMBER_WORDS[words[0]]
+        return 1
+    
+    def _recipe_index(self) -> Dict[int, Dict[str, List[str]]]:
+        """Noms de recettes en mémoire, groupés par nombre de mots significatifs."""
+        # data_version change quand une autre session (autre utilisateur) a écrit dans la base
+        self.cursor.execute("PRAGMA data_version")
+        version = self.cursor.fetchone()[0]
+        if self._recipes is None or version != self._recipes_version:
+            self._recipes_version = version
+            self._recipes = {}
+            self.cursor.execute("SELECT name FROM recipes")
+            for row in self.cursor.fetchall():
+                words = self._content_words(row['name'])
+                self._recipes.setdefault(len(words), {})[row['name']] = words
+        return self._recipes
+    
+    def find_recipe(self, name: str, cutoff: float = 0.8) -> Optional[Dict]:
+        """Cherche une décomposition connue (insensible aux accents, tolère les fautes)."""
+        key = self._normalize_recipe(name)
+        words = self._content_words(key)
+        if not words:
+            return None
+        
+        candidates = self._recipe_index().get(len(words), {})
+        if key in candidates:
+            match = key
+        else:
+            match = next((k for k, c in candidates.items()
+                          if self._recipe_matches(words, c, cutoff)), None)
+        if match is None:
+            return None
+        
+        self.cursor.execute("SELECT * FROM recipes WHERE name = ?", (match,))
+        row = self.cursor.fetchone()
+        return {"name": row['display_name'], "ingredients": json.loads(row['ingredients'])}
+    
+    def save_recipe(self, name: str, ingredients: List[Dict]) -> bool:
+        """Enregistre une décomposition (nom + catégorie par ingrédient, sans quantité)."""
+        key = self._normalize_recipe(name)
+        # Une liste de courses ("yaourts et laits", "pain, beurre") n'est pas une recette
+        if not key or re.search(r",|\bet\b", name.lower()):
+            return False
+        # Quantités différentes par ingrédient : elles ne se déduisent pas du nom
+        if len({i.get('quantity', 1) for i in ingredients if isinstance(i, dict)}) > 1:
+            return False
+        
+        ingredients = [{"name": i['name'], "category": i['category']} for i in ingredients
+                       if isinstance(i, dict) and i.get('name') and i.get('category')]
+        # Un seul ingrédient n'est pas une recette : rien à décomposer
+        if len(ingredients) < 2:
+            return False
+        
+        self.cursor.execute("""
+            INSERT INTO recipes (name, display_name, ingredients)
+            VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                display_name = excluded.display_name,
+                ingredients = excluded.ingredients
+        """, (key, self._strip_quantity(name), json.dumps(ingredients, ensure_ascii=False)))
+        self.conn.commit()
+        self._recipes = None
+        return True
+    
+    def load_recipes(self, recipes_json: str) -> int:
+        with open(recipes_json, 'r', encoding='utf-8') as f:
+            recipes = json.load(f)['recipes']
+        
+        count = 0
+        for r in recipes:
+            if not isinstance(r, dict) or not r.get('name') or not isinstance(r.get('ingredients'), list):
+                print(f"⚠️  Recette ignorée (format invalide): {r}")
+                continue
+            if self.save_recipe(r['name'], r['ingredients']):
+                count += 1
+        return count
     
     def _insert_products(self, products: List[Dict]):
         for p in products:
@@ -100,30 +327,94 @@ class GroceryDB:
             """, (p['id'], p['name'], p['brand'], p['category'], p['price'],
                   p.get('is_bio', False), p.get('is_vegan', False), p.get('is_available', True)))
         self.conn.commit()
+        self._invalidate_search_cache()
     
     def _build_semantic_index(self, products: List[Dict]):
+        self._categories = None
+        # Catalogue (ré)importé : le shard global est reconstruit ici, les shards
+        # par catégorie le seront à la demande, tous depuis le même catalogue
+        self._drop_shards()
+        
         if self.products_collection.count() > 0:
-            print(f"✓ Index sémantique déjà présent")
+            print("Reconstruction de l'index sémantique...")
+            self.chroma_client.delete_collection(name="products")
+            self.products_collection = self._get_collection("products")
+        else:
+            print("Construction de l'index sémantique...")
+        self._index_products(self.products_collection, products)
+        self._invalidate_search_cache()
+        print(f"✓ Index créé avec {len(products)} produits")
+    
+    @staticmethod
+    def _product_document(p: Dict) -> str:
+        doc = f"{p['name']} {p['brand']} {p['category']}"
+        if p.get('is_bio'):
+            doc += " bio biologique"
+        if p.get('is_vegan'):
+            doc += " vegan végétalien"
+        return doc
+    
+    def _index_products(self, collection, products: List[Dict]):
+        batch_size = self.chroma_client.get_max_batch_size()
+        for start in range(0, len(products), batch_size):
+            batch = products[start:start + batch_size]
+            collection.add(
+                documents=[self._product_document(p) for p in batch],
+                metadatas=[{"product_id": p['id'], "category": p['category']} for p in batch],
+                ids=[p['id'] for p in batch]
+            )
+    
+    def get_categories(self) -> List[str]:
+        if self._categories is None:
+            self.cursor.execute("SELECT DISTINCT category FROM products ORDER BY category")
+            self._categories = [row['category'] for row in self.cursor.fetchall()]
+        return self._categories
+    
+    @staticmethod
+    def _shard_name(category: str) -> str:
+        return f"products_{category}"
+    
+    def _drop_shards(self):
+        self.shards.clear()
+        for collection in self.chroma_client.list_collections():
+            name = getattr(collection, 'name', collection)
+            if name.startswith("products_"):
+                self.chroma_client.delete_collection(name=name)
+    
+    def _get_shard(self, category: str):
+        """Retourne le shard d'une catégorie, construit depuis SQLite au premier accès."""
+        shard = self.shards.get(category)
+        if shard is not None:
+            return shard
+        
+        shard = self._get_collection(self._shard_name(category))
+        if shard.count() == 0:
+            self.cursor.execute("SELECT * FROM products WHERE category = ?", (category,))
+            self._index_products(shard, [dict(row) for row in self.cursor.fetchall()])
+        
+        self.shards[category] = shard
+        return shard
+    
+    def rebuild_shard(self, category: Optional[str] = None):
+        """Reconstruit un shard (ou le shard global si category est None) depuis SQLite."""
+        if not self.use_semantic:
             return
         
-        print("Construction de l'index sémantique...")
-        documents = []
-        metadatas = []
-        ids = []
+        self._invalidate_search_cache()
         
-        for p in products:
-            doc = f"{p['name']} {p['brand']} {p['category']}"
-            if p.get('is_bio'):
-                doc += " bio biologique"
-            if p.get('is_vegan'):
-                doc += " vegan végétalien"
-            
-            documents.append(doc)
-            metadatas.append({"product_id": p['id'], "category": p['category']})
-            ids.append(p['id'])
+        if category is None:
+            self.chroma_client.delete_collection(name="products")
+            self.products_collection = self._get_collection("products")
+            self.cursor.execute("SELECT * FROM products")
+            self._index_products(self.products_collection, [dict(row) for row in self.cursor.fetchall()])
+            return
         
-        self.products_collection.add(documents=documents, metadatas=metadatas, ids=ids)
-        print(f"✓ Index créé avec {len(products)} produits")
+        self.shards.pop(category, None)
+        try:
+            self.chroma_client.delete_collection(name=self._shard_name(category))
+        except Exception:
+            pass
+        self._get_shard(category)
     
     def _insert_users(self, users: List[Dict]):
         for u in users:
@@ -178,17 +469,13 @@ class GroceryDB:
         if not self.use_semantic:
             return self._basic_search(query, user_id, category, limit)
         
-        where = {"category": category} if category else None
-        results = self.products_collection.query(
-            query_texts=[query],
-            n_results=min(limit * 3, 50),
-            where=where
-        )
+        product_ids = self._get_cached_ids(query, category)
+        if product_ids is None:
+            product_ids = self._vector_search(query, category)
+            self._cache_ids(query, category, product_ids)
         
-        if not results['ids'] or not results['ids'][0]:
-            return []
-        
-        products = [self._get_product_by_id(pid) for pid in results['ids'][0]]
+        # Le cache garde 50 résultats ; on ne classe que les limit * 3 premiers
+        products = [self._get_product_by_id(pid) for pid in product_ids[:min(limit * 3, 50)]]
         products = [p for p in products if p]
         
         if user_id:
@@ -196,6 +483,25 @@ class GroceryDB:
         
         return products[:limit]
     
+    def _vector_search(self, query: str, category: Optional[str] = None) -> List[str]:
+        if category:
+            if category not in self.get_categories():
+                return []
+            collection = self._get_shard(category)
+        else:
+            collection = self.products_collection
+        
+        # Profondeur fixe pour que le résultat mis en cache serve quelle que soit la limite
+        n_results = min(50, collection.count())
+        if n_results == 0:
+            return []
+        
+        results = collection.query(query_texts=[query], n_results=n_results)
+        
+        if not results['ids'] or not results['ids'][0]:
+            return []
+        return results['ids'][0]
+    
     def _basic_search(self, query: str, user_id: Optional[str] = None,
                      category: Optional[str] = None, limit: int = 10) -> List[Dict]:
         sql = "SELECT * FROM products WHERE is_available = 1"
@@ -257,7 +563,7 @@ class GroceryDB:
                       query_lower in item.category.lower() or 
                       query_lower in item.brand.lower()]
         
-        temp_collection = self.chroma_client.get_or_create_collection(name="temp_cart")
+        temp_collection = self._get_collection("temp_cart")
         
         try:
             if temp_collection.count() > 0:
@@ -295,12 +601,12 @@ class GroceryDB:
 def main():
     import sys
     
-    if len(sys.argv) != 3:
-        print("Usage: python database.py <products.json> <users.json>")
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python database.py <products.json> <users.json> [recipes.json]")
         sys.exit(1)
     
     db = GroceryDB()
-    db.initialize_from_json(sys.argv[1], sys.argv[2])
+    db.initialize_from_json(sys.argv[1], sys.argv[2], sys.argv[3] if len(sys.argv) == 4 else None)
     db.close()
 
 
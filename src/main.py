@@ -1,43 +1,65 @@
 #!/usr/bin/env python3
 
-from typing import List, Optional, Dict
+import time
+from dataclasses import asdict
+from typing import List, Optional, Dict, Callable, Tuple
 from database import GroceryDB
-from agents import ActionAgent, IngredientAgent, CartItem
+from agents import ActionAgent, IngredientAgent, CartItem, Ingredient
 
 
 class ShoppingAssistant:
-    def __init__(self, user_id: str, db: GroceryDB, model: str = "llama3.2"):
+    def __init__(self, user_id: str, db: GroceryDB, model: str = "llama3.2",
+                 large_model: Optional[str] = None, sample_every: int = 10):
         self.user_id = user_id
         self.db = db
         self.model = model
+        self.large_model = large_model
+        self.sample_every = sample_every
         self.user = db.get_user(user_id)
         self.cart: List[CartItem] = []
+        # Décompositions issues du LLM, mémorisées comme recettes si le panier est validé
+        self.pending_recipes: Dict[str, Tuple[List[Ingredient], List[str]]] = {}
         
         self.action_agent = ActionAgent(model)
-        self.ingredient_agent = IngredientAgent(model)
+        # Mêmes catégories que le catalogue, sinon _check_ingredients escalade à tort
+        self.ingredient_agent = IngredientAgent(model, categories=db.get_categories())
+        
+        # Mode cascade : modèles ayant répondu au tour courant + latences observées
+        self.turn_models: List[str] = []
+        self.turn_count = 0
+        self.small_answered = 0
+        self.small_latencies: List[float] = []  # toutes les tentatives, escaladées ou non
+        self.large_latencies: List[float] = []
+        # Appels de référence au grand modèle sur des entrées déjà résolues par le petit
+        self.baseline_latencies: List[float] = []
     
     def process(self, user_input: str):
         print(f"\n🧠 Analyse...")
+        self.turn_models = []
+        self.turn_count += 1
         
-        actions = self.action_agent.parse(user_input)
+        try:
+            self._process(user_input)
+        finally:
+            if self.large_model and self.turn_models:
+                print(f"🤖 Modèle(s) du tour: {', '.join(self.turn_models)}")
+    
+    def _process(self, user_input: str):
+        actions = self._cascade(
+            lambda model: self.action_agent.parse(user_input, model=model),
+            lambda result: self._check_actions(user_input, result)
+        )
         if not actions:
             print("⚠️  Je n'ai pas compris. Reformulez ?")
             return
         
         # Validation: filter out hallucinated actions
-        user_lower = user_input.lower()
         validated_actions = []
         for action in actions:
-            if action.type in ["view", "validate", "clear"]:
+            if self._is_grounded(user_input, action):
                 validated_actions.append(action)
             elif action.target:
-                # Check if target keywords appear in user input
-                target_words = action.target.lower().split()
-                # Keep action if at least one word from target is in user input
-                if any(word in user_lower for word in target_words if len(word) > 2):
-                    validated_actions.append(action)
-                else:
-                    print(f"   ⚠️  Action ignorée (hallucination détectée): {action.type} → {action.target}")
+                print(f"   ⚠️  Action ignorée (hallucination détectée): {action.type} → {action.target}")
         
         actions = validated_actions
         
@@ -65,9 +87,110 @@ class ShoppingAssistant:
             print()
             self._view()
     
+    def _is_grounded(self, user_input: str, action) -> bool:
+        if action.type in ["view", "validate", "clear"]:
+            return True
+        if not action.target:
+            return False
+        # Keep action if at least one word from target is in user input
+        user_lower = user_input.lower()
+        target_words = action.target.lower().split()
+        return any(word in user_lower for word in target_words if len(word) > 2)
+    
+    def _check_actions(self, user_input: str, actions) -> Optional[str]:
+        if not actions:
+            return "JSON invalide ou vide"
+        if not all(self._is_grounded(user_input, a) for a in actions):
+            return "hallucination détectée"
+        return None
+    
+    def _check_ingredients(self, ingredients) -> Optional[str]:
+        if not ingredients:
+            return "JSON invalide ou vide"
+        categories = self.db.get_categories()
+        unknown = sorted({i.category for i in ingredients if i.category not in categories})
+        if unknown:
+            return f"catégories hors catalogue: {', '.join(unknown)}"
+        return None
+    
+    def _cascade(self, run: Callable[[str], list], check: Callable[[list], Optional[str]]) -> list:
+        """Essaie le petit modèle, escalade vers le grand si la sortie échoue aux vérifications."""
+        start = time.perf_counter()
+        result = run(self.model)
+        small_elapsed = time.perf_counter() - start
+        
+        self.small_latencies.append(small_elapsed)
+        
+        reason = check(result)
+        if not self.large_model or not reason:
+            self.small_answered += 1
+            self.turn_models.append(f"{self.model} ({small_elapsed:.1f}s)")
+            if self.large_model and self.sample_every and (self.small_answered - 1) % self.sample_every == 0:
+                self._sample_baseline(run)
+            return result
+        
+        print(f"   ⤴️  Escalade vers {self.large_model} ({reason})")
+        start = time.perf_counter()
+        result = run(self.large_model)
+        large_elapsed = time.perf_counter() - start
+        
+        self.large_latencies.append(large_elapsed)
+        self.turn_models.append(f"{self.large_model} ({small_elapsed + large_elapsed:.1f}s)")
+        return result
+    
+    def _sample_baseline(self, run: Callable[[str], list]):
+        """Chronomètre le grand modèle sur une entrée facile (résultat ignoré)."""
+        start = time.perf_counter()
+        run(self.large_model)
+        elapsed = time.perf_counter() - start
+        self.baseline_latencies.append(elapsed)
+        print(f"   ⏱️  Référence {self.large_model}: {elapsed:.1f}s (échantillon, résultat ignoré)")
+    
+    def _print_cascade_stats(self):
+        if not self.large_model or not self.turn_count:
+            return
+        
+        total_calls = self.small_answered + len(self.large_latencies)
+        print(f"\n📊 Cascade: {self.small_answered}/{total_calls} appel(s) résolu(s) par {self.model}")
+        
+        if self.baseline_latencies:
+            reference = self.baseline_latencies
+            source = f"{len(reference)} appel(s) de référence échantillonné(s)"
+        elif self.large_latencies:
+            # Les entrées escaladées sont les plus difficiles : estimation biaisée vers le haut
+            reference = self.large_latencies
+            source = "estimation à partir des appels escaladés uniquement"
+        else:
+            print("   Latence économisée: inconnue (aucun appel au grand modèle)")
+            return
+        
+        avg_small = sum(self.small_latencies) / len(self.small_latencies)
+        avg_large = sum(reference) / len(reference)
+        # Référence : tous les appels faits par le grand modèle ; coût réel : toutes les
+        # tentatives du petit modèle (y compris celles escaladées) + les appels au grand
+        spent = sum(self.small_latencies) + sum(self.large_latencies)
+        saved = (total_calls * avg_large - spent) / self.turn_count
+        print(f"   Latence moyenne: {self.model} {avg_small:.1f}s | {self.large_model} {avg_large:.1f}s")
+        print(f"   Latence économisée en moyenne: {saved:.1f}s par tour ({source})")
+        if self.baseline_latencies:
+            print(f"   Coût des échantillons de référence: {sum(self.baseline_latencies):.1f}s (non compté)")
+    
     def _add(self, action):
         print(f"   🔍 Parse: '{action.target}'")
-        ingredients = self.ingredient_agent.parse(action.target)
+        recipe = self.db.find_recipe(action.target)
+        if recipe:
+            print(f"   📚 Recette connue: {recipe['name']}")
+            quantity = self.db.recipe_quantity(action.target)
+            ingredients = [Ingredient(
+                name=i.get('name', ''),
+                quantity=quantity,
+                category=i.get('category', 'autres')
+            ) for i in recipe['ingredients'] if isinstance(i, dict) and i.get('name')]
+        else:
+            ingredients = self._cascade(
+                lambda model: self.ingredient_agent.parse(action.target, model=model),
+                self._check_ingredients
+            )
         
         if not ingredients:
             print(f"   ⚠️  Aucun ingrédient trouvé")
@@ -77,8 +200,15 @@ class ShoppingAssistant:
         for ing in ingredients:
             print(f"      - {ing.name} (x{ing.quantity}) [{ing.category}]")
         
+        added = []
         for ingredient in ingredients:
-            self._add_ingredient(ingredient)
+            product_id = self._add_ingredient(ingredient)
+            if product_id:
+                added.append(product_id)
+        
+        # Seules les décompositions complètes peuvent devenir des recettes partagées
+        if not recipe and len(ingredients) > 1 and len(added) == len(ingredients):
+            self.pending_recipes[action.target] = (ingredients, added)
     
     def _add_ingredient(self, ingredient):
         products = self.db.semantic_search(
@@ -135,6 +265,8 @@ class ShoppingAssistant:
             else:
                 self.cart.append(cart_item)
                 print(f"      ✓ Ajouté: {cart_item.name} ({cart_item.brand}) x{cart_item.quantity}")
+            
+            return cart_item.product_id
     
     def _remove(self, action):
         matches = self.db.semantic_search_cart(action.target, self.cart)
@@ -188,6 +320,20 @@ class ShoppingAssistant:
             self.user = self.db.get_user(self.user_id)
             print(f"   ✓ {preferences_saved} préférence(s) sauvegardée(s)")
         
+        # Mémoriser les décompositions dont les produits sont restés dans le panier
+        cart_ids = {item.product_id for item in self.cart}
+        recipes_saved = 0
+        for target, (ingredients, product_ids) in self.pending_recipes.items():
+            # Un panier filtré (marques exclues, vegan, retraits) ne doit pas tronquer la recette
+            if not all(pid in cart_ids for pid in product_ids):
+                continue
+            if self.db.save_recipe(target, [asdict(ing) for ing in ingredients]):
+                recipes_saved += 1
+        self.pending_recipes.clear()
+        
+        if recipes_saved > 0:
+            print(f"   📚 {recipes_saved} recette(s) mémorisée(s)")
+        
         total = sum(item.price * item.quantity for item in self.cart)
         print(f"   ✓ Commande validée!")
         print(f"   💰 Total: {total:.2f}€")
@@ -198,6 +344,7 @@ class ShoppingAssistant:
     def _clear(self):
         count = len(self.cart)
         self.cart.clear()
+        self.pending_recipes.clear()
         print(f"   ✓ Panier vidé ({count} articles)")
     
     def _ask_brand(self, category: str, options: List[Dict]) -> Optional[Dict]:
@@ -254,6 +401,7 @@ class ShoppingAssistant:
             except Exception as e:
                 print(f"⚠️  Erreur: {e}")
         
+        self._print_cascade_stats()
         self.db.close()
 
 
@@ -261,7 +409,7 @@ def main():
     import sys
     
     if len(sys.argv) < 2:
-        print("Usage: python main.py <user_id> [--model MODEL_NAME]")
+        print("Usage: python main.py <user_id> [--model MODEL_NAME] [--cascade LARGE_MODEL]")
         print("\nUsers disponibles: user_alice, user_bob, user_clara")
         print("\nModèles recommandés (du meilleur au plus rapide):")
         print("  - mistral-nemo    (12B, excellent français + parsing)")
@@ -270,7 +418,12 @@ def main():
         print("  - mixtral         (47B, top tier mais lourd)")
         print("  - llama3.1        (8B, fallback solide)")
         print("  - llama3.2        (3B, rapide mais moins fiable)")
+        print("\nMode cascade: --model sert de petit modèle, escalade vers LARGE_MODEL")
+        print("si la sortie échoue aux vérifications (JSON, hallucination, catégories)")
+        print("  --cascade-sample N : chronomètre aussi le grand modèle sur 1 appel réussi")
+        print("                       du petit modèle sur N (référence, défaut 10, 0 = jamais)")
         print("\nExemple: python src/main.py user_alice --model mistral-nemo")
+        print("         python src/main.py user_alice --model llama3.2 --cascade mistral-nemo")
         sys.exit(1)
     
     user_id = sys.argv[1]
@@ -284,8 +437,22 @@ def main():
     else:
         print(f"ℹ️  Modèle par défaut: {model} (utilisez --model pour changer)")
     
+    large_model = None
+    if "--cascade" in sys.argv:
+        cascade_idx = sys.argv.index("--cascade")
+        if cascade_idx + 1 < len(sys.argv):
+            large_model = sys.argv[cascade_idx + 1]
+            print(f"🪜 Mode cascade: {model} → {large_model}")
+    
+    sample_every = 10
+    if "--cascade-sample" in sys.argv:
+        sample_idx = sys.argv.index("--cascade-sample")
+        if sample_idx + 1 < len(sys.argv):
+            sample_every = int(sys.argv[sample_idx + 1])
+    
     db = GroceryDB()
-    assistant = ShoppingAssistant(user_id, db, model=model)
+    assistant = ShoppingAssistant(user_id, db, model=model, large_model=large_model,
+                                  sample_every=sample_every)
     assistant.run()
 
 
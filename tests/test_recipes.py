@@ -0,0 +1,60 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from database import GroceryDB  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = GroceryDB(db_path=str(tmp_path / "grocery.db"), use_semantic=False)
+    db.load_recipes(str(ROOT / "data" / "recipes.json"))
+    yield db
+    db.close()
+
+
+def names(recipe):
+    return None if recipe is None else recipe['name']
+
+
+@pytest.mark.parametrize("query", ["pâtes bolognaise", "Pates Bolognaises", "2 pâte bolognese",
+                                   "des pâtes bolognaise", "deux pates bolognaise"])
+def test_find_recipe_tolerates_accents_plural_typos_and_quantity(db, query):
+    assert names(db.find_recipe(query)) == "pâtes bolognaise"
+
+
+@pytest.mark.parametrize("query", ["salade de pâtes", "salade de patates", "pâtes au pistou",
+                                   "pâtes", "lait", "pâtes bolognaise maison"])
+def test_find_recipe_rejects_recipes_with_a_different_word(db, query):
+    assert db.find_recipe(query) is None
+
+
+def test_save_recipe_strips_quantity_from_display_name(db):
+    ingredients = [{"name": "pâtes", "quantity": 2, "category": "pates"},
+                   {"name": "saumon", "quantity": 2, "category": "poisson"}]
+    assert db.save_recipe("2 pâtes au saumon", ingredients)
+    assert names(db.find_recipe("3 pates au saumon")) == "pâtes au saumon"
+
+
+def test_save_recipe_refuses_lists_and_mixed_quantities(db):
+    ingredients = [{"name": "yaourt", "quantity": 3, "category": "yaourt"},
+                   {"name": "lait", "quantity": 2, "category": "lait"}]
+    assert not db.save_recipe("3 yaourts et 2 laits", ingredients)
+    assert not db.save_recipe("yaourts, laits", [dict(i, quantity=1) for i in ingredients])
+    assert not db.save_recipe("petit dessert lacté", ingredients)
+    assert db.find_recipe("1 yaourt et 6 laits") is None
+
+
+def test_save_recipe_refuses_single_ingredient(db):
+    assert not db.save_recipe("2 bouteilles de lait", [{"name": "lait", "quantity": 2, "category": "lait"}])
+    assert db.find_recipe("3 bouteilles de lait") is None
+
+
+@pytest.mark.parametrize("text, quantity", [("3 pâtes bolognaise", 3), ("deux omelettes", 2),
+                                            ("pâtes pour 4 personnes", 1), ("omelette", 1)])
+def test_recipe_quantity_reads_only_leading_number(text, quantity):
+    assert GroceryDB.recipe_quantity(text) == quantity